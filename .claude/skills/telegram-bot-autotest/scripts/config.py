@@ -7,53 +7,271 @@ All output is JSON for Claude to parse.
 """
 
 import argparse
+import functools
+import itertools
 import json
 import os
+import re
 import sys
 from pathlib import Path
+from types import SimpleNamespace
+
+# orjson is optional; it encodes faster than the stdlib json module
+try:
+    import orjson
+
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+except ImportError:
+    # Match orjson's compact, non-ASCII-escaping output
+    dumps = functools.partial(json.dumps, separators=(",", ":"), ensure_ascii=False)
+
+
+@functools.lru_cache(maxsize=None)
+def config_dir():
+    """Resolve ~/.telegram-bot-autotest on first use rather than at import."""
+    return Path.home() / ".telegram-bot-autotest"
+
+
+@functools.lru_cache(maxsize=None)
+def _env_file():
+    """Path to the .env file as a str, for direct os.path / os.stat calls."""
+    return os.path.join(config_dir(), ".env")
+
+
+@functools.lru_cache(maxsize=1)
+def _ensure_config_dir():
+    """Create the config dir once per process, skipping mkdir if it exists."""
+    path = config_dir()
+    if not os.path.isdir(path):
+        path.mkdir(parents=True, exist_ok=True)
 
-CONFIG_DIR = Path.home() / ".telegram-bot-autotest"
-ENV_FILE = CONFIG_DIR / ".env"
 
 REQUIRED_KEYS = ["TG_API_ID", "TG_API_HASH", "TG_PHONE"]
-OPTIONAL_KEYS = ["TG_SESSION_PATH"]
+OPTIONAL_KEYS = ["TG_SESSION_PATH", "TG_PHONE_LIST"]
 ALL_KEYS = REQUIRED_KEYS + OPTIONAL_KEYS
+SENSITIVE_KEYS = frozenset({"TG_API_HASH"})
+
+# Fixed-shape error response, formatted with dumps() only for the message
+_ERROR_TMPL = '{{"ok":false,"error":{error}}}\n'
+
+
+@functools.lru_cache(maxsize=1)
+def _check_ok_responses():
+    """Prebuilt success responses for check, keyed by the set of present keys.
+
+    A successful check always has every required key, so only the optional
+    keys vary: 2 ** len(OPTIONAL_KEYS) responses in total.
+    """
+    responses = {}
+    for r in range(len(OPTIONAL_KEYS) + 1):
+        for extra in itertools.combinations(OPTIONAL_KEYS, r):
+            present = REQUIRED_KEYS + list(extra)
+            responses[frozenset(present)] = (dumps({
+                "ok": True,
+                "configured": True,
+                "missing": [],
+                "present": present,
+                "message": "All required configuration is present."
+            }) + "\n").encode()
+    return responses
+
+
+def _print_error(message):
+    """Write the common {"ok": false, "error": ...} response to stdout."""
+    sys.stdout.write(_ERROR_TMPL.format(error=dumps(message)))
+
+
+# A quoted value (escapes allowed inside), optionally followed by a # comment
+_QUOTED_RE = re.compile(r"""(['"])((?:\\.|(?!\1).)*)\1\s*(?:#.*)?$""", re.S)
+
+
+def _unquote(value):
+    """Strip one pair of matching quotes (and any trailing comment) from a .env value."""
+    m = _QUOTED_RE.match(value)
+    if m:
+        quote, inner = m.groups()
+        return re.sub(r"\\([\\" + quote + "])", r"\1", inner)
+    # Unquoted values may carry a trailing " # comment"
+    return value.split(" #", 1)[0].rstrip()
+
+
+def _quote(value):
+    """Quote a value so that _unquote() reads back exactly `value`."""
+    escaped = value.replace("\\", "\\\\")
+    if "'" not in value:
+        return f"'{escaped}'"
+    return '"' + escaped.replace('"', '\\"') + '"'
+
+
+def _split_line(line):
+    """Return (key, raw_value) for a KEY=VALUE line, or (None, None)."""
+    stripped = line.strip()
+    if not stripped or stripped.startswith("#") or "=" not in stripped:
+        return None, None
+    if stripped.startswith("export "):
+        stripped = stripped[len("export "):]
+    key, _, raw = stripped.partition("=")
+    return key.strip(), raw.strip()
+
+
+def _parse_env(text):
+    """Parse .env text into a dict of KEY -> value."""
+    values = {}
+    for line in text.splitlines():
+        key, raw = _split_line(line)
+        if key:
+            values[key] = _unquote(raw)
+    return values
+
+
+def _set_keys(path, updates):
+    """Update or append keys in a .env file, rewriting it atomically (0600)."""
+    path = Path(path)
+    lines = path.read_text().splitlines() if os.path.exists(path) else []
+    written = set()
+    out = []
+    for line in lines:
+        key, _ = _split_line(line)
+        if key not in updates:
+            out.append(line)
+        elif key not in written:
+            # The first occurrence takes the new value; later duplicates are
+            # dropped, since the parser lets the last one win
+            out.append(f"{key}={_quote(updates[key])}")
+            written.add(key)
+    out.extend(f"{k}={_quote(v)}" for k, v in updates.items() if k not in written)
+
+    tmp = path.with_name(path.name + ".tmp")
+    # Create the file with its final mode in one call; clear the umask so
+    # the 0600 bits are applied exactly and no chmod is needed afterwards.
+    old_umask = os.umask(0)
+    try:
+        fd = os.open(str(tmp), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    finally:
+        os.umask(old_umask)
+    with os.fdopen(fd, "w") as f:
+        f.write("\n".join(out) + "\n")
+    os.replace(tmp, path)
+
+
+@functools.lru_cache(maxsize=4)
+def _load_env(path_str, mtime_ns):
+    """Parse a .env file once per (path, mtime) pair."""
+    with open(path_str) as f:
+        return _parse_env(f.read())
+
+
+def _read_key(path, key):
+    """Scan a .env file for a single key without parsing the whole file.
+
+    Returns None if the key is absent. As with _parse_env, the last
+    occurrence wins.
+    """
+    found = None
+    with open(path) as f:
+        for line in f:
+            if key not in line:
+                continue
+            k, raw = _split_line(line)
+            if k == key:
+                found = _unquote(raw)
+    return found
+
+
+def load_env():
+    """Return the parsed .env values, reusing the cached parse if unchanged."""
+    env_file = _env_file()
+    return _load_env(env_file, os.stat(env_file).st_mtime_ns)
+
+
+def load_settings():
+    """Return the .env values, each overridden by a same-named environment variable.
+
+    Raises FileNotFoundError only when there is no .env and none of the
+    keys is exported either.
+    """
+    overrides = {k: os.environ[k] for k in ALL_KEYS if os.environ.get(k)}
+    try:
+        values = dict(load_env())
+    except FileNotFoundError:
+        if not overrides:
+            raise
+        values = {}
+    values.update(overrides)
+    return values
 
 
-def ensure_dotenv():
-    try:
-        from dotenv import dotenv_values, set_key
-        return dotenv_values, set_key
-    except ImportError:
-        print(json.dumps({
-            "ok": False,
-            "error": "python-dotenv not installed. Run: pip3 install python-dotenv"
-        }))
-        sys.exit(1)
+@functools.lru_cache(maxsize=None)
+def _check_cache_file():
+    return config_dir() / ".check_cache"
 
 
-def cmd_check():
-    """Check if all required config values are present."""
-    dotenv_values, _ = ensure_dotenv()
+def _read_check_cache(mtime_ns, size):
+    """Return the cached successful check response for this .env, if any.
 
-    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
+    The .env's mtime and size must both match, and so must ALL_KEYS, so a
+    cache written by a version checking other keys is never reused.
+    """
+    try:
+        with open(_check_cache_file()) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if (cache.get("mtime_ns") != mtime_ns or cache.get("size") != size
+            or cache.get("keys") != ALL_KEYS):
+        return None
+    return cache.get("blob")
+
+
+def _write_check_cache(mtime_ns, size, blob):
+    """Remember a successful check response; failures to write are ignored."""
+    try:
+        fd = os.open(str(_check_cache_file()), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({"mtime_ns": mtime_ns, "size": size, "keys": ALL_KEYS, "blob": blob}, f)
+    except OSError:
+        pass
+
+
+def cmd_check(values=None):
+    """Check if all required config values are present.
+
+    values may be an already-parsed .env snapshot; when omitted the file
+    is read, or its cached check response reused.
+    """
+    mtime_ns = size = None
+    if values is None:
+        _ensure_config_dir()
+
+        env_file = _env_file()
+        try:
+            st = os.stat(env_file)
+        except FileNotFoundError:
+            print(dumps({
+                "ok": False,
+                "configured": False,
+                "missing": REQUIRED_KEYS,
+                "present": [],
+                "message": "No .env file found. Please set configuration first."
+            }))
+            sys.exit(1)
+        mtime_ns, size = st.st_mtime_ns, st.st_size
 
-    if not ENV_FILE.exists():
-        print(json.dumps({
-            "ok": False,
-            "configured": False,
-            "missing": REQUIRED_KEYS,
-            "present": [],
-            "message": "No .env file found. Please set configuration first."
-        }))
-        sys.exit(1)
+        # An unchanged .env gives the same answer, so skip the parse entirely
+        blob = _read_check_cache(mtime_ns, size)
+        if blob:
+            os.write(sys.stdout.fileno(), blob.encode())
+            return
+
+        values = _load_env(env_file, mtime_ns)
 
-    values = dotenv_values(ENV_FILE)
-    present = [k for k in ALL_KEYS if values.get(k)]
-    missing = [k for k in REQUIRED_KEYS if not values.get(k)]
+    truthy = {k for k, v in values.items() if v}
+    present = [k for k in ALL_KEYS if k in truthy]
+    missing = [k for k in REQUIRED_KEYS if k not in truthy]
 
     if missing:
-        print(json.dumps({
+        print(dumps({
             "ok": False,
             "configured": False,
             "missing": missing,
@@ -62,23 +280,16 @@ def cmd_check():
         }))
         sys.exit(1)
 
-    print(json.dumps({
-        "ok": True,
-        "configured": True,
-        "missing": [],
-        "present": present,
-        "message": "All required configuration is present."
-    }))
+    blob = _check_ok_responses()[frozenset(present)]
+    sys.stdout.flush()
+    os.write(sys.stdout.fileno(), blob)
+    if mtime_ns is not None:
+        _write_check_cache(mtime_ns, size, blob.decode())
 
 
 def cmd_set(args):
     """Write config values to .env file."""
-    _, set_key = ensure_dotenv()
-
-    CONFIG_DIR.mkdir(parents=True, exist_ok=True)
-
-    if not ENV_FILE.exists():
-        ENV_FILE.touch(mode=0o600)
+    _ensure_config_dir()
 
     updates = {}
     if args.api_id:
@@ -89,69 +300,89 @@ def cmd_set(args):
         updates["TG_PHONE"] = args.phone
     if args.session_path:
         updates["TG_SESSION_PATH"] = args.session_path
+    if args.phone_list:
+        updates["TG_PHONE_LIST"] = args.phone_list
 
     if not updates:
-        print(json.dumps({
-            "ok": False,
-            "error": "No values provided to set."
-        }))
+        _print_error("No values provided to set.")
         sys.exit(1)
 
-    for key, value in updates.items():
-        set_key(str(ENV_FILE), key, value)
-
-    # Restrict file permissions
-    os.chmod(ENV_FILE, 0o600)
+    # Apply every update in a single read + rewrite of the file
+    _set_keys(_env_file(), updates)
 
-    print(json.dumps({
+    print(dumps({
         "ok": True,
         "updated": list(updates.keys()),
         "message": f"Updated {len(updates)} config value(s)."
     }))
 
 
-def cmd_get(args):
-    """Read config values from .env file."""
-    dotenv_values, _ = ensure_dotenv()
+def _mask(value):
+    """Mask a sensitive value, keeping only its first and last 4 characters."""
+    return f"{value[:4]}...{value[-4:]}" if len(value) > 8 else "***"
 
-    if not ENV_FILE.exists():
-        print(json.dumps({
-            "ok": False,
-            "error": "No .env file found."
-        }))
-        sys.exit(1)
 
-    values = dotenv_values(ENV_FILE)
+def cmd_get(args, values=None):
+    """Read config values from .env file, or from a pre-parsed snapshot."""
+    if values is None and not os.path.exists(_env_file()):
+        _print_error("No .env file found.")
+        sys.exit(1)
 
     if args.key:
-        val = values.get(args.key)
+        if values is None:
+            val = _read_key(_env_file(), args.key)
+        else:
+            val = values.get(args.key)
         if val is None:
-            print(json.dumps({
-                "ok": False,
-                "error": f"Key '{args.key}' not found."
-            }))
+            _print_error(f"Key '{args.key}' not found.")
             sys.exit(1)
-        print(json.dumps({
+        print(dumps({
             "ok": True,
             "key": args.key,
             "value": val
         }))
     else:
         # Return all keys (mask sensitive values)
+        if values is None:
+            values = load_env()
         result = {}
         for k in ALL_KEYS:
             v = values.get(k)
-            if v and k in ("TG_API_HASH",):
-                result[k] = v[:4] + "..." + v[-4:] if len(v) > 8 else "***"
-            elif v:
-                result[k] = v
-        print(json.dumps({
+            if v:
+                result[k] = _mask(v) if k in SENSITIVE_KEYS else v
+        print(dumps({
             "ok": True,
             "config": result
         }))
 
 
+# Command argument name -> (subcommand dest, legacy top-level flag dest)
+SET_FIELDS = {
+    "api_id": ("api_id", "api_id_legacy"),
+    "api_hash": ("api_hash", "api_hash_legacy"),
+    "phone": ("phone", "phone_legacy"),
+    "session_path": ("session_path", "session_path_legacy"),
+    "phone_list": ("phone_list", "phone_list_legacy"),
+}
+GET_FIELDS = {"key": ("key", "key_legacy")}
+
+
+def _merge_legacy(args, fields):
+    """Merge subcommand and legacy flag values into one namespace."""
+    parsed = vars(args)
+    return SimpleNamespace(**{
+        name: parsed.get(new) or parsed.get(legacy)
+        for name, (new, legacy) in fields.items()
+    })
+
+
 def main():
+    # `check` takes no arguments, so dispatch it before building the
+    # full parser with all the set/get and legacy flag definitions.
+    if sys.argv[1:] in (["check"], ["--check"]):
+        cmd_check()
+        return
+
     parser = argparse.ArgumentParser(description="Telegram Bot Autotest Config Manager")
     sub = parser.add_subparsers(dest="command")
 
@@ -162,6 +393,8 @@ def main():
     set_p.add_argument("--api-hash", dest="api_hash")
     set_p.add_argument("--phone", dest="phone")
     set_p.add_argument("--session-path", dest="session_path")
+    set_p.add_argument("--phone-list", dest="phone_list",
+                       help="Comma-separated phones for tg_login.py multi-account --check")
 
     get_p = sub.add_parser("get", help="Get config values")
     get_p.add_argument("--key", help="Specific key to retrieve")
@@ -174,6 +407,7 @@ def main():
     parser.add_argument("--api-hash", dest="api_hash_legacy")
     parser.add_argument("--phone", dest="phone_legacy")
     parser.add_argument("--session-path", dest="session_path_legacy")
+    parser.add_argument("--phone-list", dest="phone_list_legacy")
     parser.add_argument("--key", dest="key_legacy")
 
     args = parser.parse_args()
@@ -182,17 +416,9 @@ def main():
     if args.check or args.command == "check":
         cmd_check()
     elif args.set or args.command == "set":
-        # Merge legacy args
-        class SetArgs:
-            api_id = getattr(args, 'api_id', None) or getattr(args, 'api_id_legacy', None)
-            api_hash = getattr(args, 'api_hash', None) or getattr(args, 'api_hash_legacy', None)
-            phone = getattr(args, 'phone', None) or getattr(args, 'phone_legacy', None)
-            session_path = getattr(args, 'session_path', None) or getattr(args, 'session_path_legacy', None)
-        cmd_set(SetArgs())
+        cmd_set(_merge_legacy(args, SET_FIELDS))
     elif args.get or args.command == "get":
-        class GetArgs:
-            key = getattr(args, 'key', None) or getattr(args, 'key_legacy', None)
-        cmd_get(GetArgs())
+        cmd_get(_merge_legacy(args, GET_FIELDS))
     else:
         parser.print_help()
         sys.exit(1)
@@ -9,7 +9,7 @@ SESSIONS_DIR="$CONFIG_DIR/sessions"
 REPORTS_DIR="$CONFIG_DIR/reports"
 
 json_ok() {
-    echo "{\"ok\":true,\"python\":\"$1\",\"pip\":\"$2\",\"telethon\":\"$3\",\"dotenv\":\"$4\",\"message\":\"Environment ready.\"}"
+    echo "{\"ok\":true,\"python\":\"$1\",\"pip\":\"$2\",\"telethon\":\"$3\",\"message\":\"Environment ready.\"}"
 }
 
 json_error() {
@@ -50,21 +50,8 @@ else
     fi
 fi
 
-# Install python-dotenv if needed
-DOTENV_VER=""
-if python3 -c "from dotenv import dotenv_values" &>/dev/null; then
-    DOTENV_VER=$(python3 -c "from importlib.metadata import version; print(version('python-dotenv'))" 2>/dev/null || echo "installed")
-else
-    $PIP_CMD install python-dotenv -q 2>/dev/null
-    if python3 -c "from dotenv import dotenv_values" &>/dev/null; then
-        DOTENV_VER=$(python3 -c "from importlib.metadata import version; print(version('python-dotenv'))" 2>/dev/null || echo "installed")
-    else
-        json_error "Failed to install python-dotenv."
-    fi
-fi
-
 # Create runtime directories
 mkdir -p "$SESSIONS_DIR" "$REPORTS_DIR"
 chmod 700 "$CONFIG_DIR"
 
-json_ok "$PYTHON_VER" "$PIP_VER" "$TELETHON_VER" "$DOTENV_VER"
+json_ok "$PYTHON_VER" "$PIP_VER" "$TELETHON_VER"
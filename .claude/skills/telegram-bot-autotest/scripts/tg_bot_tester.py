@@ -33,27 +33,75 @@ Output: Complete bot structure blueprint as JSON.
 
 import argparse
 import asyncio
+import heapq
+import itertools
 import json
 import os
 import random
 import re
 import sys
-from collections import deque
+import time
+import unicodedata
 from datetime import datetime, timezone
-from pathlib import Path
+
+try:
+    from telethon import TelegramClient, events
+    from telethon.errors import (
+        BotResponseTimeoutError, DataInvalidError,
+        FloodWaitError, MessageIdInvalidError, TimeoutError as TelethonTimeout,
+    )
+    from telethon.tl.functions.messages import GetBotCallbackAnswerRequest
+    from telethon.tl.functions.users import GetFullUserRequest
+    from telethon.tl.types import (
+        KeyboardButtonCallback, KeyboardButtonRequestGeoLocation,
+        KeyboardButtonRequestPhone, KeyboardButtonSwitchInline, KeyboardButtonUrl,
+        ReplyInlineMarkup, ReplyKeyboardMarkup,
+    )
+except ImportError:
+    TelegramClient = None  # reported by main()
+
+# Ensure parent dir is importable (for config.py)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import config_dir, load_settings
+
+# orjson is optional; reports from deep crawls encode much faster with it.
+# Either way the report is encoded to UTF-8 bytes.
+try:
+    import orjson
+
+    def _dumps_report(report):
+        return orjson.dumps(report, option=orjson.OPT_INDENT_2)
+
+    def _dumps_line(report):
+        return orjson.dumps(report)
+except ImportError:
+    def _iso(obj):
+        # Message dates are kept as datetimes until the report is encoded
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+    def _dumps_report(report):
+        return json.dumps(report, indent=2, ensure_ascii=False, default=_iso).encode("utf-8")
+
+    def _dumps_line(report):
+        return json.dumps(report, separators=(",", ":"), ensure_ascii=False, default=_iso).encode("utf-8")
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends go unlocked
+    fcntl = None
 
 
 def load_config():
+    # .env values, overridden by any exported TG_* variable, exactly as
+    # tg_login.py resolves them
     try:
-        from dotenv import dotenv_values
-    except ImportError:
-        return None, "python-dotenv not installed"
-
-    env_file = Path.home() / ".telegram-bot-autotest" / ".env"
-    if not env_file.exists():
+        values = load_settings()
+    except FileNotFoundError:
         return None, "Config file not found."
 
-    values = dotenv_values(env_file)
     api_id = values.get("TG_API_ID")
     api_hash = values.get("TG_API_HASH")
 
@@ -62,7 +110,7 @@ def load_config():
 
     session_path = values.get("TG_SESSION_PATH")
     if not session_path:
-        session_path = str(Path.home() / ".telegram-bot-autotest" / "sessions" / "tg_user")
+        session_path = str(config_dir() / "sessions" / "tg_user")
 
     return {
         "api_id": int(api_id),
@@ -75,7 +123,12 @@ def load_config():
 # Constants
 # ---------------------------------------------------------------------------
 
-INTERACTION_DELAY = 1.0
+# Interactions are paced by a token bucket instead of a fixed sleep
+INTERACTION_RATE = 5          # interactions per second (bucket size too)
+# Once a bot starts replying, stop collecting after this long with no new event
+RESPONSE_SETTLE = 0.5
+# Upper bound on how long to wait for a message/edit after a button click
+CLICK_RESPONSE_TIMEOUT = 2.0
 UNKNOWN_PATTERNS = [
     "unknown command", "i don't understand", "i don't know that command",
     "unrecognized command", "invalid command", "command not found",
@@ -104,26 +157,63 @@ DEBUG_INPUTS = [
 ]
 
 
+# All of UNKNOWN_PATTERNS in one case-insensitive pass
+_UNKNOWN_RE = re.compile("|".join(re.escape(p) for p in UNKNOWN_PATTERNS), re.IGNORECASE)
+
+
 def is_unknown_response(text):
-    if not text:
-        return False
-    t = text.lower()
-    return any(p in t for p in UNKNOWN_PATTERNS)
+    return bool(text) and _UNKNOWN_RE.search(text) is not None
 
 
 # ---------------------------------------------------------------------------
 # Message & button serialization
 # ---------------------------------------------------------------------------
 
+def _callback_button(btn):
+    b = {"text": btn.text, "type": "callback"}
+    try:
+        b["data"] = btn.data.decode("utf-8") if btn.data else ""
+    except UnicodeDecodeError:
+        # Keep the exact bytes so the button can still be clicked
+        b["data"] = btn.data.decode("utf-8", errors="replace")
+        b["data_hex"] = btn.data.hex()
+    return b
+
+
+def _url_button(btn):
+    return {"text": btn.text, "type": "url", "url": btn.url}
+
+
+def _switch_inline_button(btn):
+    return {"text": btn.text, "type": "switch_inline", "query": btn.query}
+
+
+def _share_phone_button(btn):
+    return {"text": btn.text, "type": "share_phone"}
+
+
+def _share_geo_button(btn):
+    return {"text": btn.text, "type": "share_geo"}
+
+
+# Button type -> serializer, dispatched on the exact type. Without Telethon
+# main() exits before any message is serialized.
+if TelegramClient is not None:
+    _INLINE_HANDLERS = {
+        KeyboardButtonCallback: _callback_button,
+        KeyboardButtonUrl: _url_button,
+        KeyboardButtonSwitchInline: _switch_inline_button,
+        KeyboardButtonRequestPhone: _share_phone_button,
+        KeyboardButtonRequestGeoLocation: _share_geo_button,
+    }
+    _KEYBOARD_HANDLERS = {
+        KeyboardButtonRequestPhone: _share_phone_button,
+        KeyboardButtonRequestGeoLocation: _share_geo_button,
+    }
+
+
 def extract_button_layout(reply_markup):
     """Extract the FULL button layout from a reply markup, preserving rows and types."""
-    from telethon.tl.types import (
-        ReplyInlineMarkup, ReplyKeyboardMarkup,
-        KeyboardButtonUrl, KeyboardButtonRequestPhone,
-        KeyboardButtonRequestGeoLocation, KeyboardButtonCallback,
-        KeyboardButtonSwitchInline,
-    )
-
     if not reply_markup:
         return None, None
 
@@ -135,23 +225,11 @@ def extract_button_layout(reply_markup):
         for row in reply_markup.rows:
             row_btns = []
             for btn in row.buttons:
-                b = {"text": btn.text}
-                if isinstance(btn, KeyboardButtonCallback):
-                    b["type"] = "callback"
-                    b["data"] = btn.data.decode("utf-8", errors="replace") if btn.data else ""
-                elif isinstance(btn, KeyboardButtonUrl):
-                    b["type"] = "url"
-                    b["url"] = btn.url
-                elif isinstance(btn, KeyboardButtonSwitchInline):
-                    b["type"] = "switch_inline"
-                    b["query"] = btn.query
-                elif isinstance(btn, KeyboardButtonRequestPhone):
-                    b["type"] = "share_phone"
-                elif isinstance(btn, KeyboardButtonRequestGeoLocation):
-                    b["type"] = "share_geo"
+                handler = _INLINE_HANDLERS.get(type(btn))
+                if handler:
+                    row_btns.append(handler(btn))
                 else:
-                    b["type"] = type(btn).__name__
-                row_btns.append(b)
+                    row_btns.append({"text": btn.text, "type": type(btn).__name__})
             inline_layout.append(row_btns)
 
     if isinstance(reply_markup, ReplyKeyboardMarkup):
@@ -159,14 +237,11 @@ def extract_button_layout(reply_markup):
         for row in reply_markup.rows:
             row_btns = []
             for btn in row.buttons:
-                b = {"text": btn.text}
-                if isinstance(btn, KeyboardButtonRequestPhone):
-                    b["type"] = "share_phone"
-                elif isinstance(btn, KeyboardButtonRequestGeoLocation):
-                    b["type"] = "share_geo"
+                handler = _KEYBOARD_HANDLERS.get(type(btn))
+                if handler:
+                    row_btns.append(handler(btn))
                 else:
-                    b["type"] = "text"
-                row_btns.append(b)
+                    row_btns.append({"text": btn.text, "type": "text"})
             keyboard_layout.append(row_btns)
 
     return inline_layout, keyboard_layout
@@ -177,7 +252,7 @@ def serialize_message(msg):
     data = {
         "id": msg.id,
         "text": msg.text or "",
-        "date": msg.date.isoformat() if msg.date else None,
+        "date": msg.date,  # formatted as ISO 8601 when the report is encoded
     }
 
     inline_layout, keyboard_layout = extract_button_layout(msg.reply_markup)
@@ -199,10 +274,165 @@ def serialize_message(msg):
 # Interaction helpers
 # ---------------------------------------------------------------------------
 
+def _format_error(e):
+    """Render an exception the same way everywhere in the report."""
+    return f"{type(e).__name__}: {e}"
+
+
+def callback_bytes(btn):
+    """Return the raw callback data of a serialized inline button."""
+    if "data_hex" in btn:
+        return bytes.fromhex(btn["data_hex"])
+    return btn["data"].encode("utf-8")
+
+
+class VisitState:
+    """Everything already explored during one run, keyed canonically.
+
+    Each mark_* method records its argument and returns True only the first
+    time it is seen, so callers can write `if visit.mark_command(cmd): ...`.
+    """
+
+    def __init__(self):
+        self.seen_callbacks = set()
+        self.seen_commands = set()
+        self.seen_reply_labels = set()
+
+    def mark_callback(self, data):
+        """`data` is the raw callback bytes of an inline button."""
+        if data in self.seen_callbacks:
+            return False
+        self.seen_callbacks.add(data)
+        return True
+
+    def mark_command(self, cmd):
+        """`/Foo@SomeBot` and `/foo` count as the same command."""
+        key = cmd.strip().lower().split("@", 1)[0]
+        if key in self.seen_commands:
+            return False
+        self.seen_commands.add(key)
+        return True
+
+    def mark_reply_label(self, label):
+        key = unicodedata.normalize("NFC", label).strip()
+        if key in self.seen_reply_labels:
+            return False
+        self.seen_reply_labels.add(key)
+        return True
+
+
+class RateLimiter:
+    """Token bucket allowing `rate` interactions per `per` seconds.
+
+    Waiters are served in arrival order, so callers are never starved.
+    """
+
+    def __init__(self, rate, per=1.0):
+        self.rate = rate
+        self.per = per
+        self.capacity = max(1.0, float(rate))  # rates below 1 still allow one
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def wait(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate / self.per)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) * self.per / self.rate)
+
+
+class BotEventCollector:
+    """Buffers new and edited bot messages pushed by Telethon event handlers.
+
+    Lets the interaction helpers return as soon as the bot has answered
+    instead of sleeping for a fixed amount of time.
+    """
+
+    def __init__(self, client, bot_entity):
+        self.client = client
+        self.bot_entity = bot_entity
+        self.queue = asyncio.Queue()
+
+    def start(self):
+        self.client.add_event_handler(
+            self._on_new, events.NewMessage(chats=self.bot_entity, incoming=True))
+        self.client.add_event_handler(
+            self._on_edit, events.MessageEdited(chats=self.bot_entity, incoming=True))
+
+    async def _on_new(self, event):
+        self.queue.put_nowait(("new", event.message))
+
+    async def _on_edit(self, event):
+        self.queue.put_nowait(("edited", event.message))
+
+    def clear(self):
+        """Drop anything the bot sent before the interaction we are about to make."""
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    async def collect(self, timeout, settle=RESPONSE_SETTLE):
+        """Wait up to `timeout` for a first event, then until `settle` seconds pass quietly.
+
+        Returns a list of (kind, message) tuples, kind being "new" or "edited".
+        """
+        received = []
+        wait = timeout
+        while True:
+            try:
+                received.append(await asyncio.wait_for(self.queue.get(), timeout=wait))
+            except asyncio.TimeoutError:
+                return received
+            wait = settle
+
+
+class TreeNode:
+    """One clicked button in the BFS exploration tree.
+
+    `button_raw` holds the exact callback bytes for re-clicking; the report
+    only shows the decoded `button_data`.
+    """
+
+    __slots__ = (
+        "path", "depth", "button_text", "button_data", "button_raw",
+        "callback_answer", "error", "result_message", "result_edited",
+    )
+
+    def __init__(self, path, depth, button_text, button_data, button_raw,
+                 callback_answer=None, error=None):
+        self.path = path
+        self.depth = depth
+        self.button_text = button_text
+        self.button_data = button_data
+        self.button_raw = button_raw
+        self.callback_answer = callback_answer
+        self.error = error
+        self.result_message = None
+        self.result_edited = None
+
+    def to_dict(self):
+        d = {
+            "path": self.path,
+            "depth": self.depth,
+            "button_text": self.button_text,
+            "button_data": self.button_data,
+            "callback_answer": self.callback_answer,
+            "error": self.error,
+        }
+        if self.result_message is not None:
+            d["result_message"] = self.result_message
+        if self.result_edited is not None:
+            d["result_edited"] = self.result_edited
+        return d
+
+
 async def send_and_capture(client, bot_entity, text, timeout=10):
     """Send a text message and capture all bot responses."""
-    from telethon.errors import TimeoutError as TelethonTimeout
-
     record = {
         "action": "send_message",
         "sent": text,
@@ -212,45 +442,72 @@ async def send_and_capture(client, bot_entity, text, timeout=10):
     }
 
     try:
-        try:
-            async with client.conversation(bot_entity, timeout=timeout) as conv:
-                await conv.send_message(text)
-                await asyncio.sleep(0.5)
-                try:
-                    while True:
-                        resp = await asyncio.wait_for(conv.get_response(), timeout=3)
-                        record["responses"].append(serialize_message(resp))
-                except (asyncio.TimeoutError, TelethonTimeout):
-                    pass
-        except Exception:
-            await client.send_message(bot_entity, text)
-            await asyncio.sleep(min(timeout, 5))
-            messages = []
-            async for msg in client.iter_messages(bot_entity, limit=5):
-                if msg.out:
-                    break
-                messages.append(msg)
-            messages.reverse()
-            record["responses"] = [serialize_message(m) for m in messages]
+        # Non-exclusive, so a conversation left open elsewhere never blocks this one
+        async with client.conversation(bot_entity, timeout=timeout, exclusive=False) as conv:
+            await conv.send_message(text)
+            # Wait the full timeout for the first reply, then only until
+            # the bot has been quiet for RESPONSE_SETTLE seconds.
+            wait = timeout
+            try:
+                while True:
+                    resp = await asyncio.wait_for(conv.get_response(), timeout=wait)
+                    record["responses"].append(serialize_message(resp))
+                    wait = RESPONSE_SETTLE
+            except (asyncio.TimeoutError, TelethonTimeout):
+                pass
     except asyncio.TimeoutError:
         record["timed_out"] = True
     except Exception as e:
-        record["error"] = f"{type(e).__name__}: {e}"
+        record["error"] = _format_error(e)
+
+    return _finish_record(record)
+
 
+def _finish_record(record):
     if not record["responses"] and not record["error"]:
         record["timed_out"] = True
-
     return record
 
 
-async def click_button(client, msg_id, bot_entity, button_data_raw):
-    """Click an inline callback button, return full result with any new buttons."""
-    from telethon.tl.functions.messages import GetBotCallbackAnswerRequest
-    from telethon.errors import (
-        MessageIdInvalidError, BotResponseTimeoutError,
-        DataInvalidError,
-    )
+def _count_reply(stats, rec, counter=None, ok=None):
+    """Update run stats for one sent message and its capture record.
 
+    `counter` is an extra stats key to bump (e.g. "commands_tested"). `ok`
+    overrides whether the reply counts as successful; by default any
+    response does.
+    """
+    stats["total_interactions"] += 1
+    if counter:
+        stats[counter] += 1
+    if ok is None:
+        ok = bool(rec["responses"])
+    if ok:
+        stats["successful_responses"] += 1
+    elif rec["timed_out"]:
+        stats["timeouts"] += 1
+
+
+async def probe_commands(client, bot_entity, commands, timeout, limiter):
+    """Send each command (or any text) in turn and capture its replies.
+
+    Probes never overlap: replies to plain text carry no reply_to, so the
+    only way to attribute them is to wait for one probe's replies before
+    sending the next. Results are returned in the same order as `commands`.
+    """
+    records = []
+    for cmd in commands:
+        await limiter.wait()
+        records.append(await send_and_capture(client, bot_entity, cmd, timeout))
+    return records
+
+
+async def click_button(client, msg_id, bot_entity, button_data_raw, collector):
+    """Click an inline callback button, return full result with any new buttons.
+
+    `collector` is the BotEventCollector for this bot. The new or edited
+    messages it receives during the click window are the click's result, so
+    no message history is fetched.
+    """
     record = {
         "callback_answer": None,
         "new_message": None,
@@ -259,9 +516,7 @@ async def click_button(client, msg_id, bot_entity, button_data_raw):
     }
 
     try:
-        pre_msgs = []
-        async for m in client.iter_messages(bot_entity, limit=3):
-            pre_msgs.append(m.id)
+        collector.clear()
 
         data_bytes = button_data_raw.encode("utf-8") if isinstance(button_data_raw, str) else button_data_raw
 
@@ -280,41 +535,42 @@ async def click_button(client, msg_id, bot_entity, button_data_raw):
         except BotResponseTimeoutError:
             record["callback_answer"] = None
 
-        await asyncio.sleep(2)
-
-        # Check for new or edited messages
-        async for m in client.iter_messages(bot_entity, limit=5):
-            if m.out:
-                break
-            if m.id not in pre_msgs:
-                record["new_message"] = serialize_message(m)
-                break
-
-        # Also check if the original message was edited
-        try:
-            edited_msg = await client.get_messages(bot_entity, ids=msg_id)
-            if edited_msg and edited_msg.edit_date:
-                record["edited_message"] = serialize_message(edited_msg)
-        except Exception:
-            pass
+        # Wait until the bot sends or edits a message (or the timeout passes).
+        # The first new message is the result; for edits of the clicked
+        # message the latest version wins.
+        for kind, m in await collector.collect(CLICK_RESPONSE_TIMEOUT):
+            if kind == "new":
+                if record["new_message"] is None:
+                    record["new_message"] = serialize_message(m)
+            elif m.id == msg_id:
+                record["edited_message"] = serialize_message(m)
 
     except MessageIdInvalidError:
         record["error"] = "MessageIdInvalidError"
     except DataInvalidError:
         record["error"] = "DataInvalidError"
     except Exception as e:
-        record["error"] = f"{type(e).__name__}: {e}"
+        record["error"] = _format_error(e)
 
     return record
 
 
+# /command — Telegram caps command names at 32 characters
+_CMD_RE = re.compile(r'/[a-zA-Z_][a-zA-Z0-9_]{0,31}')
+
+
 def extract_commands_from_help(text):
     """Parse /help response text to discover commands."""
     if not text:
         return []
-    # Match patterns like /command or /command — description
-    matches = re.findall(r'(/[a-zA-Z_][a-zA-Z0-9_]*)', text)
-    return list(dict.fromkeys(matches))  # dedupe, preserve order
+    seen = set()
+    commands = []
+    for m in _CMD_RE.finditer(text):
+        cmd = m.group(0)
+        if cmd not in seen:  # dedupe, preserve order
+            seen.add(cmd)
+            commands.append(cmd)
+    return commands
 
 
 def collect_callback_buttons(data):
@@ -332,12 +588,12 @@ def collect_callback_buttons(data):
 # Bug analysis (debug mode)
 # ---------------------------------------------------------------------------
 
+_ERROR_RE = re.compile("|".join(re.escape(p) for p in ERROR_PATTERNS), re.IGNORECASE)
+
+
 def _response_has_error_text(text):
     """Check if response text contains error-like patterns."""
-    if not text:
-        return False
-    t = text.lower()
-    return any(p in t for p in ERROR_PATTERNS)
+    return bool(text) and _ERROR_RE.search(text) is not None
 
 
 def analyze_bugs(report):
@@ -532,11 +788,8 @@ def compute_health_score(bugs):
 # Main engine
 # ---------------------------------------------------------------------------
 
-async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode="blueprint"):
-    from telethon import TelegramClient
-    from telethon.tl.functions.users import GetFullUserRequest
-    from telethon.errors import FloodWaitError
-
+async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode="blueprint",
+                   rate=INTERACTION_RATE):
     config, error = load_config()
     if error:
         return {"ok": False, "error": error}
@@ -576,6 +829,10 @@ async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode=
             await client.disconnect()
             return {"ok": False, "error": f"Cannot find bot '{bot_username}': {e}"}
 
+        collector = BotEventCollector(client, bot_entity)
+        collector.start()
+        limiter = RateLimiter(rate)
+
         # --- Bot info ---
         try:
             full_user = await client(GetFullUserRequest(bot_entity))
@@ -600,146 +857,120 @@ async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode=
                 bot_info["registered_commands"] = []
             report["bot_info"] = bot_info
         except Exception as e:
-            report["bot_info"] = {"error": str(e)}
+            report["bot_info"] = {"error": _format_error(e)}
 
         # =====================================================================
         # Phase 1: /start
         # =====================================================================
-        await asyncio.sleep(INTERACTION_DELAY)
+        await limiter.wait()
         start_rec = await send_and_capture(client, bot_entity, "/start", timeout)
-        stats["total_interactions"] += 1
-        stats["commands_tested"] += 1
-        if start_rec["responses"]:
-            stats["successful_responses"] += 1
-        elif start_rec["timed_out"]:
-            stats["timeouts"] += 1
+        _count_reply(stats, start_rec, "commands_tested")
         report["structure"]["start"] = start_rec
 
         # =====================================================================
         # Phase 2: /help
         # =====================================================================
-        await asyncio.sleep(INTERACTION_DELAY)
+        await limiter.wait()
         help_rec = await send_and_capture(client, bot_entity, "/help", timeout)
-        stats["total_interactions"] += 1
-        stats["commands_tested"] += 1
-        if help_rec["responses"]:
-            stats["successful_responses"] += 1
-        elif help_rec["timed_out"]:
-            stats["timeouts"] += 1
+        _count_reply(stats, help_rec, "commands_tested")
         report["structure"]["help"] = help_rec
 
         # =====================================================================
         # Phase 3: BFS recursive inline button exploration
         # =====================================================================
-        # Queue items: (msg_id, button_text, button_data, depth, parent_path)
-        button_queue = deque()
-        visited_data = set()  # track callback data to avoid loops
-        button_tree = []      # flat list with path info for tree reconstruction
-
-        def enqueue_buttons_from(source, depth, parent_path):
-            """Add all callback buttons from a response to the BFS queue."""
-            if isinstance(source, dict):
-                items = [source]
-            elif isinstance(source, list):
-                items = source
-            else:
+        # Heap items: (depth, order, msg_id, button_text, button_data, parent_path, raw_data)
+        # so shallower buttons are always clicked first, FIFO within a depth.
+        # The queue never needs to hold much more than the click budget.
+        button_queue = []
+        queue_cap = max_buttons * 4
+        enqueue_order = itertools.count()
+        visit = VisitState()  # callbacks/commands/labels already explored
+        visit.mark_command("/start")
+        visit.mark_command("/help")
+        button_tree = []      # TreeNodes with path info for tree reconstruction
+
+        def enqueue_buttons_from(responses, depth, parent_path):
+            """Add all callback buttons from a list of responses to the BFS queue."""
+            if depth > max_depth:
                 return
-
-            for resp in items:
+            push = heapq.heappush
+            mark_callback = visit.mark_callback
+            for resp in responses:
                 msg_id = resp.get("id")
                 if not msg_id:
                     continue
-                for row in resp.get("inline_buttons", []):
+                for row in resp.get("inline_buttons", ()):
                     for btn in row:
+                        if len(button_queue) >= queue_cap:
+                            return
                         if btn.get("type") == "callback" and btn.get("data"):
-                            data_key = btn["data"]
-                            if data_key not in visited_data:
-                                visited_data.add(data_key)
-                                button_queue.append((
-                                    msg_id,
-                                    btn["text"],
-                                    btn["data"],
-                                    depth,
-                                    parent_path,
+                            raw = callback_bytes(btn)
+                            if mark_callback(raw):
+                                push(button_queue, (
+                                    depth, next(enqueue_order),
+                                    msg_id, btn["text"], btn["data"], parent_path, raw,
                                 ))
 
-        # Seed from /start responses
-        for resp in start_rec.get("responses", []):
-            enqueue_buttons_from(resp, 1, "/start")
-
-        # Seed from /help responses
-        for resp in help_rec.get("responses", []):
-            enqueue_buttons_from(resp, 1, "/help")
+        # Seed from /start and /help responses
+        enqueue_buttons_from(start_rec["responses"], 1, "/start")
+        enqueue_buttons_from(help_rec["responses"], 1, "/help")
 
         total_clicked = 0
 
-        while button_queue and total_clicked < max_buttons:
-            msg_id, btn_text, btn_data, depth, parent_path = button_queue.popleft()
-
-            if depth > max_depth:
-                continue
+        async def drain_button_queue():
+            """Click queued buttons (BFS) until the queue or click budget runs out."""
+            nonlocal total_clicked
+            while button_queue and total_clicked < max_buttons:
+                depth, _, msg_id, btn_text, btn_data, parent_path, btn_raw = heapq.heappop(button_queue)
 
-            await asyncio.sleep(INTERACTION_DELAY)
-            stats["total_interactions"] += 1
-            stats["buttons_explored"] += 1
-            total_clicked += 1
+                await limiter.wait()
+                stats["total_interactions"] += 1
+                stats["buttons_explored"] += 1
+                total_clicked += 1
 
-            current_path = f"{parent_path} > [{btn_text}]"
+                current_path = f"{parent_path} > [{btn_text}]"
 
-            try:
-                result = await click_button(client, msg_id, bot_entity, btn_data)
-            except FloodWaitError as e:
-                button_tree.append({
-                    "path": current_path,
-                    "depth": depth,
-                    "button_text": btn_text,
-                    "button_data": btn_data,
-                    "error": f"FloodWaitError: wait {e.seconds}s",
-                })
-                stats["errors"] += 1
-                break
-            except Exception as e:
-                button_tree.append({
-                    "path": current_path,
-                    "depth": depth,
-                    "button_text": btn_text,
-                    "button_data": btn_data,
-                    "error": str(e),
-                })
-                stats["errors"] += 1
-                continue
+                try:
+                    result = await click_button(client, msg_id, bot_entity, btn_raw, collector)
+                except FloodWaitError as e:
+                    button_tree.append(TreeNode(
+                        current_path, depth, btn_text, btn_data, btn_raw,
+                        error=f"FloodWaitError: wait {e.seconds}s",
+                    ))
+                    stats["errors"] += 1
+                    break
+                except Exception as e:
+                    button_tree.append(TreeNode(current_path, depth, btn_text, btn_data, btn_raw, error=_format_error(e)))
+                    stats["errors"] += 1
+                    continue
 
-            node = {
-                "path": current_path,
-                "depth": depth,
-                "button_text": btn_text,
-                "button_data": btn_data,
-                "callback_answer": result.get("callback_answer"),
-                "error": result.get("error"),
-            }
+                node = TreeNode(
+                    current_path, depth, btn_text, btn_data, btn_raw,
+                    callback_answer=result.get("callback_answer"),
+                    error=result.get("error"),
+                )
 
-            if result.get("error"):
-                stats["errors"] += 1
-            else:
-                stats["successful_responses"] += 1
+                if result.get("error"):
+                    stats["errors"] += 1
+                else:
+                    stats["successful_responses"] += 1
 
-            # Record new message if any
-            if result.get("new_message"):
-                node["result_message"] = result["new_message"]
-                # Enqueue new buttons from this message
+                # Record new/edited message if any
+                node.result_message = result.get("new_message")
+                node.result_edited = result.get("edited_message")
+                # Enqueue new buttons from these messages
                 if depth < max_depth:
-                    enqueue_buttons_from(result["new_message"], depth + 1, current_path)
+                    enqueue_buttons_from(
+                        [m for m in (node.result_message, node.result_edited) if m],
+                        depth + 1, current_path,
+                    )
 
-            # Record edited message if any
-            if result.get("edited_message"):
-                node["result_edited"] = result["edited_message"]
-                if depth < max_depth:
-                    enqueue_buttons_from(result["edited_message"], depth + 1, current_path)
+                if depth > stats["max_depth_reached"]:
+                    stats["max_depth_reached"] = depth
 
-            if depth > stats["max_depth_reached"]:
-                stats["max_depth_reached"] = depth
+                button_tree.append(node)
 
-            button_tree.append(node)
+        await drain_button_queue()
 
         report["structure"]["button_tree"] = button_tree
 
@@ -749,128 +980,59 @@ async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode=
         reply_buttons = []
         reply_results = []
 
-        # Collect reply keyboards from all responses so far
-        for phase_key in ("start", "help"):
-            phase = report["structure"].get(phase_key, {})
-            for resp in phase.get("responses", []):
-                for row in resp.get("reply_keyboard", []):
-                    for btn in row:
-                        if btn.get("type") == "text":
-                            reply_buttons.append(btn["text"])
-
-        # Also check button_tree results for reply keyboards
+        # Collect reply keyboards from all responses so far, including the
+        # messages shown by button clicks
+        messages = start_rec["responses"] + help_rec["responses"]
         for node in button_tree:
-            for key in ("result_message", "result_edited"):
-                msg = node.get(key)
-                if msg:
-                    for row in msg.get("reply_keyboard", []):
-                        for btn in row:
-                            if btn.get("type") == "text":
-                                reply_buttons.append(btn["text"])
-
-        # Dedupe
-        seen_reply = set()
-        for btn_text in reply_buttons:
-            if btn_text in seen_reply:
-                continue
-            seen_reply.add(btn_text)
+            if node.result_message:
+                messages.append(node.result_message)
+            if node.result_edited:
+                messages.append(node.result_edited)
 
-            await asyncio.sleep(INTERACTION_DELAY)
-            rec = await send_and_capture(client, bot_entity, btn_text, timeout)
+        for msg in messages:
+            for row in msg.get("reply_keyboard", ()):
+                for btn in row:
+                    if btn.get("type") == "text":
+                        reply_buttons.append(btn["text"])
+
+        labels_to_probe = [b for b in reply_buttons if visit.mark_reply_label(b)]
+        reply_recs = await probe_commands(
+            client, bot_entity, labels_to_probe, timeout, limiter,
+        )
+        for btn_text, rec in zip(labels_to_probe, reply_recs):
             rec["button_label"] = btn_text
             reply_results.append(rec)
-            stats["total_interactions"] += 1
-            stats["buttons_explored"] += 1
-            if rec["responses"]:
-                stats["successful_responses"] += 1
-            elif rec["timed_out"]:
-                stats["timeouts"] += 1
+            _count_reply(stats, rec, "buttons_explored")
 
         report["structure"]["reply_keyboard"] = reply_results
 
         # =====================================================================
         # Phase 5: Registered commands
         # =====================================================================
-        already_tested = {"/start", "/help"}
         reg_results = []
 
+        reg_to_probe = []
         for cmd_info in report["bot_info"].get("registered_commands", []):
-            cmd = cmd_info["command"]
-            if cmd in already_tested:
+            if not visit.mark_command(cmd_info["command"]):
                 continue
-            already_tested.add(cmd)
+            reg_to_probe.append(cmd_info)
 
-            await asyncio.sleep(INTERACTION_DELAY)
-            rec = await send_and_capture(client, bot_entity, cmd, timeout)
+        reg_recs = await probe_commands(
+            client, bot_entity, [c["command"] for c in reg_to_probe],
+            timeout, limiter,
+        )
+        for cmd_info, rec in zip(reg_to_probe, reg_recs):
+            cmd = cmd_info["command"]
             rec["command_description"] = cmd_info.get("description", "")
             reg_results.append(rec)
-            stats["total_interactions"] += 1
-            stats["commands_tested"] += 1
-            if rec["responses"]:
-                stats["successful_responses"] += 1
-                # Enqueue new inline buttons from command responses
-                for resp in rec["responses"]:
-                    enqueue_buttons_from(resp, 1, cmd)
-            elif rec["timed_out"]:
-                stats["timeouts"] += 1
+            _count_reply(stats, rec, "commands_tested")
+            # Enqueue new inline buttons from command responses
+            enqueue_buttons_from(rec["responses"], 1, cmd)
 
         report["structure"]["registered_commands"] = reg_results
 
         # Explore any new buttons discovered from registered commands
-        while button_queue and total_clicked < max_buttons:
-            msg_id, btn_text, btn_data, depth, parent_path = button_queue.popleft()
-            if depth > max_depth:
-                continue
-
-            await asyncio.sleep(INTERACTION_DELAY)
-            stats["total_interactions"] += 1
-            stats["buttons_explored"] += 1
-            total_clicked += 1
-            current_path = f"{parent_path} > [{btn_text}]"
-
-            try:
-                result = await click_button(client, msg_id, bot_entity, btn_data)
-            except FloodWaitError as e:
-                button_tree.append({
-                    "path": current_path, "depth": depth,
-                    "button_text": btn_text, "button_data": btn_data,
-                    "error": f"FloodWaitError: wait {e.seconds}s",
-                })
-                stats["errors"] += 1
-                break
-            except Exception as e:
-                button_tree.append({
-                    "path": current_path, "depth": depth,
-                    "button_text": btn_text, "button_data": btn_data,
-                    "error": str(e),
-                })
-                stats["errors"] += 1
-                continue
-
-            node = {
-                "path": current_path, "depth": depth,
-                "button_text": btn_text, "button_data": btn_data,
-                "callback_answer": result.get("callback_answer"),
-                "error": result.get("error"),
-            }
-            if result.get("error"):
-                stats["errors"] += 1
-            else:
-                stats["successful_responses"] += 1
-
-            if result.get("new_message"):
-                node["result_message"] = result["new_message"]
-                if depth < max_depth:
-                    enqueue_buttons_from(result["new_message"], depth + 1, current_path)
-            if result.get("edited_message"):
-                node["result_edited"] = result["edited_message"]
-                if depth < max_depth:
-                    enqueue_buttons_from(result["edited_message"], depth + 1, current_path)
-
-            if depth > stats["max_depth_reached"]:
-                stats["max_depth_reached"] = depth
-
-            button_tree.append(node)
+        await drain_button_queue()
 
         # =====================================================================
         # Phase 6: Commands discovered from /help text
@@ -882,108 +1044,46 @@ async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode=
         discovered_cmds = extract_commands_from_help(help_text)
         discovered_results = []
 
+        discovered_to_probe = []
         for cmd in discovered_cmds:
-            if cmd in already_tested:
+            if not visit.mark_command(cmd):
                 continue
-            already_tested.add(cmd)
-
-            await asyncio.sleep(INTERACTION_DELAY)
-            rec = await send_and_capture(client, bot_entity, cmd, timeout)
-            stats["total_interactions"] += 1
-            stats["commands_tested"] += 1
+            discovered_to_probe.append(cmd)
 
+        discovered_recs = await probe_commands(
+            client, bot_entity, discovered_to_probe, timeout, limiter,
+        )
+        for cmd, rec in zip(discovered_to_probe, discovered_recs):
             first_text = rec["responses"][0].get("text", "") if rec["responses"] else ""
-            if rec["responses"] and not is_unknown_response(first_text):
-                rec["recognized"] = True
-                stats["successful_responses"] += 1
-                discovered_results.append(rec)
+            rec["recognized"] = bool(rec["responses"]) and not is_unknown_response(first_text)
+            _count_reply(stats, rec, "commands_tested", rec["recognized"])
+            discovered_results.append(rec)
+            if rec["recognized"]:
                 # Enqueue buttons
-                for resp in rec["responses"]:
-                    enqueue_buttons_from(resp, 1, cmd)
-            else:
-                rec["recognized"] = False
-                if rec["timed_out"]:
-                    stats["timeouts"] += 1
-                discovered_results.append(rec)
+                enqueue_buttons_from(rec["responses"], 1, cmd)
 
         report["structure"]["discovered_commands"] = discovered_results
 
         # Explore buttons from discovered commands
-        while button_queue and total_clicked < max_buttons:
-            msg_id, btn_text, btn_data, depth, parent_path = button_queue.popleft()
-            if depth > max_depth:
-                continue
-
-            await asyncio.sleep(INTERACTION_DELAY)
-            stats["total_interactions"] += 1
-            stats["buttons_explored"] += 1
-            total_clicked += 1
-            current_path = f"{parent_path} > [{btn_text}]"
-
-            try:
-                result = await click_button(client, msg_id, bot_entity, btn_data)
-            except FloodWaitError as e:
-                button_tree.append({
-                    "path": current_path, "depth": depth,
-                    "button_text": btn_text, "button_data": btn_data,
-                    "error": f"FloodWaitError: wait {e.seconds}s",
-                })
-                stats["errors"] += 1
-                break
-            except Exception as e:
-                button_tree.append({
-                    "path": current_path, "depth": depth,
-                    "button_text": btn_text, "button_data": btn_data,
-                    "error": str(e),
-                })
-                stats["errors"] += 1
-                continue
-
-            node = {
-                "path": current_path, "depth": depth,
-                "button_text": btn_text, "button_data": btn_data,
-                "callback_answer": result.get("callback_answer"),
-                "error": result.get("error"),
-            }
-            if result.get("error"):
-                stats["errors"] += 1
-            else:
-                stats["successful_responses"] += 1
-            if result.get("new_message"):
-                node["result_message"] = result["new_message"]
-                if depth < max_depth:
-                    enqueue_buttons_from(result["new_message"], depth + 1, current_path)
-            if result.get("edited_message"):
-                node["result_edited"] = result["edited_message"]
-                if depth < max_depth:
-                    enqueue_buttons_from(result["edited_message"], depth + 1, current_path)
-            if depth > stats["max_depth_reached"]:
-                stats["max_depth_reached"] = depth
-            button_tree.append(node)
+        await drain_button_queue()
 
         # =====================================================================
         # Phase 7: Common commands probing
         # =====================================================================
         probe_results = []
+        common_to_probe = []
         for cmd in COMMON_COMMANDS:
-            if cmd in already_tested:
+            if not visit.mark_command(cmd):
                 continue
-            already_tested.add(cmd)
-
-            await asyncio.sleep(INTERACTION_DELAY)
-            rec = await send_and_capture(client, bot_entity, cmd, timeout)
-            stats["total_interactions"] += 1
-            stats["commands_tested"] += 1
+            common_to_probe.append(cmd)
 
+        common_recs = await probe_commands(
+            client, bot_entity, common_to_probe, timeout, limiter,
+        )
+        for rec in common_recs:
             first_text = rec["responses"][0].get("text", "") if rec["responses"] else ""
-            if rec["responses"] and not is_unknown_response(first_text):
-                rec["recognized"] = True
-                stats["successful_responses"] += 1
-            else:
-                rec["recognized"] = False
-                if rec["timed_out"]:
-                    stats["timeouts"] += 1
-
+            rec["recognized"] = bool(rec["responses"]) and not is_unknown_response(first_text)
+            _count_reply(stats, rec, "commands_tested", rec["recognized"])
             probe_results.append(rec)
 
         report["structure"]["common_commands"] = probe_results
@@ -992,17 +1092,13 @@ async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode=
         # Phase 8: Input Handling Test (debug mode only)
         # =====================================================================
         if mode == "debug":
-            input_results = []
-            for inp in DEBUG_INPUTS:
-                await asyncio.sleep(INTERACTION_DELAY)
-                rec = await send_and_capture(client, bot_entity, inp["value"], timeout)
+            input_results = await probe_commands(
+                client, bot_entity, [inp["value"] for inp in DEBUG_INPUTS],
+                timeout, limiter,
+            )
+            for inp, rec in zip(DEBUG_INPUTS, input_results):
                 rec["input_label"] = inp["label"]
-                input_results.append(rec)
-                stats["total_interactions"] += 1
-                if rec["responses"]:
-                    stats["successful_responses"] += 1
-                elif rec["timed_out"]:
-                    stats["timeouts"] += 1
+                _count_reply(stats, rec)
 
             report["structure"]["input_handling"] = input_results
 
@@ -1014,46 +1110,48 @@ async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode=
             # Select up to 10 previously visited callback buttons to re-click
             candidates = []
             for node in button_tree:
-                if node.get("error"):
+                if node.error:
                     continue
-                if node.get("button_data") and (node.get("result_message") or node.get("result_edited") or node.get("callback_answer")):
+                if node.button_raw and (node.result_message or node.result_edited or node.callback_answer):
                     candidates.append(node)
 
             sample = candidates[:10] if len(candidates) <= 10 else random.sample(candidates, 10)
 
+            # Which message currently carries each callback button, keyed on
+            # the raw callback bytes (non-UTF-8 data decodes lossily). Built from
+            # one history fetch and then kept current from click results, so
+            # the chat is not re-read before every repeat click.
+            button_owner = {}
+
+            def remember_buttons(msg):
+                for owned, owner in list(button_owner.items()):
+                    if owner == msg["id"]:
+                        del button_owner[owned]
+                for row in msg.get("inline_buttons", ()):
+                    for btn in row:
+                        if btn.get("type") == "callback" and btn.get("data"):
+                            button_owner[callback_bytes(btn)] = msg["id"]
+
+            if sample:
+                # Oldest first so the newest message wins for a repeated button
+                for m in reversed(await client.get_messages(bot_entity, limit=20)):
+                    if not m.out and m.reply_markup:
+                        remember_buttons(serialize_message(m))
+
             for original in sample:
-                btn_data = original["button_data"]
-                btn_text = original["button_text"]
-                path = original.get("path", "unknown")
-
-                # We need a valid msg_id to click. Try to find one from the latest
-                # messages in the chat — re-send /start to get a fresh context.
-                await asyncio.sleep(INTERACTION_DELAY)
-
-                # Find a message that has this button data still present
-                # The simplest approach: look for messages with inline buttons
-                msg_id = None
-                async for m in client.iter_messages(bot_entity, limit=20):
-                    if m.out:
-                        continue
-                    if m.reply_markup:
-                        inline, _ = extract_button_layout(m.reply_markup)
-                        if inline:
-                            for row in inline:
-                                for btn in row:
-                                    if btn.get("data") == btn_data:
-                                        msg_id = m.id
-                                        break
-                                if msg_id:
-                                    break
-                    if msg_id:
-                        break
+                btn_data = original.button_data
+                btn_text = original.button_text
+                path = original.path
 
+                # We need a valid msg_id to click: a recent message that still
+                # has this button
+                msg_id = button_owner.get(original.button_raw)
                 if not msg_id:
                     continue
 
+                await limiter.wait()
                 try:
-                    result = await click_button(client, msg_id, bot_entity, btn_data)
+                    result = await click_button(client, msg_id, bot_entity, original.button_raw, collector)
                 except FloodWaitError as e:
                     repeat_results.append({
                         "path": path,
@@ -1069,7 +1167,7 @@ async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode=
                         "path": path,
                         "button_text": btn_text,
                         "button_data": btn_data,
-                        "error": str(e),
+                        "error": _format_error(e),
                         "inconsistent": False,
                     })
                     stats["errors"] += 1
@@ -1077,18 +1175,20 @@ async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode=
 
                 stats["total_interactions"] += 1
                 stats["buttons_explored"] += 1
+                for key in ("new_message", "edited_message"):
+                    if result.get(key):
+                        remember_buttons(result[key])
 
                 # Compare with original result
                 inconsistent = False
                 difference = None
 
-                orig_cb = original.get("callback_answer")
+                orig_cb = original.callback_answer
                 new_cb = result.get("callback_answer")
 
                 orig_text = ""
                 new_text = ""
-                for key in ("result_message", "result_edited"):
-                    orig_msg = original.get(key)
+                for orig_msg in (original.result_message, original.result_edited):
                     if orig_msg:
                         orig_text = orig_msg.get("text", "")
                 for key in ("new_message", "edited_message"):
@@ -1129,10 +1229,12 @@ async def run_test(bot_username, timeout=10, max_depth=5, max_buttons=100, mode=
         report["error"] = f"FloodWaitError: must wait {e.seconds}s. Test aborted."
         stats["errors"] += 1
     except Exception as e:
-        report["error"] = f"{type(e).__name__}: {e}"
+        report["error"] = _format_error(e)
         stats["errors"] += 1
     finally:
         await client.disconnect()
+        if "button_tree" in report["structure"]:
+            report["structure"]["button_tree"] = [n.to_dict() for n in report["structure"]["button_tree"]]
 
     return report
 
@@ -1165,7 +1267,7 @@ def _find_button_in_responses(responses, target_text):
     """Find a callback button matching target_text in a list of serialized responses.
 
     Uses substring matching and case-insensitive comparison as fallback.
-    Returns (msg_id, button_text, button_data) or (None, None, None).
+    Returns (msg_id, button_text, button_data, callback_bytes) or all None.
     """
     # Pass 1: exact match
     for resp in responses:
@@ -1175,7 +1277,7 @@ def _find_button_in_responses(responses, target_text):
         for row in resp.get("inline_buttons", []):
             for btn in row:
                 if btn.get("type") == "callback" and btn.get("text") == target_text:
-                    return msg_id, btn["text"], btn["data"]
+                    return msg_id, btn["text"], btn["data"], callback_bytes(btn)
 
     # Pass 2: case-insensitive match
     target_lower = target_text.lower()
@@ -1186,7 +1288,7 @@ def _find_button_in_responses(responses, target_text):
         for row in resp.get("inline_buttons", []):
             for btn in row:
                 if btn.get("type") == "callback" and btn.get("text", "").lower() == target_lower:
-                    return msg_id, btn["text"], btn["data"]
+                    return msg_id, btn["text"], btn["data"], callback_bytes(btn)
 
     # Pass 3: substring match (target is contained in button text, or vice versa)
     for resp in responses:
@@ -1199,16 +1301,13 @@ def _find_button_in_responses(responses, target_text):
                     continue
                 btn_text = btn.get("text", "")
                 if target_lower in btn_text.lower() or btn_text.lower() in target_lower:
-                    return msg_id, btn["text"], btn["data"]
+                    return msg_id, btn["text"], btn["data"], callback_bytes(btn)
 
-    return None, None, None
+    return None, None, None, None
 
 
-async def run_targeted_test(bot_username, path_str, timeout=10):
+async def run_targeted_test(bot_username, path_str, timeout=10, rate=INTERACTION_RATE):
     """Execute only the specific path and return the result of each step."""
-    from telethon import TelegramClient
-    from telethon.errors import FloodWaitError
-
     config, error = load_config()
     if error:
         return {"ok": False, "error": error}
@@ -1240,11 +1339,15 @@ async def run_targeted_test(bot_username, path_str, timeout=10):
             await client.disconnect()
             return {"ok": False, "error": f"Cannot find bot '{bot_username}': {e}"}
 
+        collector = BotEventCollector(client, bot_entity)
+        collector.start()
+        limiter = RateLimiter(rate)
+
         command = steps[0]
         button_steps = steps[1:]
 
         # Step 1: Send the initial command
-        await asyncio.sleep(INTERACTION_DELAY)
+        await limiter.wait()
         cmd_rec = await send_and_capture(client, bot_entity, command, timeout)
 
         step_entry = {
@@ -1276,9 +1379,9 @@ async def run_targeted_test(bot_username, path_str, timeout=10):
         current_responses = cmd_rec.get("responses", [])
 
         for i, btn_target in enumerate(button_steps):
-            await asyncio.sleep(INTERACTION_DELAY)
+            await limiter.wait()
 
-            msg_id, matched_text, btn_data = _find_button_in_responses(current_responses, btn_target)
+            msg_id, matched_text, btn_data, btn_raw = _find_button_in_responses(current_responses, btn_target)
 
             if msg_id is None:
                 # Also check edited messages from the previous step's result
@@ -1296,7 +1399,7 @@ async def run_targeted_test(bot_username, path_str, timeout=10):
                 break
 
             try:
-                result = await click_button(client, msg_id, bot_entity, btn_data)
+                result = await click_button(client, msg_id, bot_entity, btn_raw, collector)
             except FloodWaitError as e:
                 report["steps"].append({
                     "action": "click_button",
@@ -1312,7 +1415,7 @@ async def run_targeted_test(bot_username, path_str, timeout=10):
                     "target": btn_target,
                     "matched_text": matched_text,
                     "button_data": btn_data,
-                    "error": f"{type(e).__name__}: {e}",
+                    "error": _format_error(e),
                 })
                 break
 
@@ -1358,13 +1461,22 @@ async def run_targeted_test(bot_username, path_str, timeout=10):
     except FloodWaitError as e:
         report["error"] = f"FloodWaitError: must wait {e.seconds}s. Test aborted."
     except Exception as e:
-        report["error"] = f"{type(e).__name__}: {e}"
+        report["error"] = _format_error(e)
     finally:
         await client.disconnect()
 
     return report
 
 
+def append_jsonl(path, report):
+    """Append `report` as a single JSON line, locked against concurrent runs."""
+    line = _dumps_line(report) + b"\n"
+    with open(path, "ab") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        f.write(line)
+
+
 def main():
     parser = argparse.ArgumentParser(description="Telegram Bot Deep Explorer")
     parser.add_argument("bot", help="Bot username (e.g. @BotFather)")
@@ -1375,9 +1487,19 @@ def main():
                         help="Test mode: blueprint (structure mapping), debug (bug finding), or targeted (specific path)")
     parser.add_argument("--path", type=str, default=None,
                         help="Targeted mode path, e.g. '/start > [Button A] > [Button B]'")
+    parser.add_argument("--rate", type=float, default=INTERACTION_RATE,
+                        help=f"Max interactions per second (default: {INTERACTION_RATE})")
     parser.add_argument("--save", action="store_true", help="Save report to ~/.telegram-bot-autotest/reports/")
+    parser.add_argument("--save-jsonl", type=str, default=None, metavar="PATH",
+                        help="Append the report as one JSON line to PATH")
 
     args = parser.parse_args()
+    if TelegramClient is None:
+        print(json.dumps({"ok": False, "error": "telethon not installed"}))
+        sys.exit(1)
+    if args.rate <= 0:
+        print(json.dumps({"ok": False, "error": "--rate must be greater than 0"}))
+        sys.exit(1)
 
     bot = args.bot
     if not bot.startswith("@"):
@@ -1387,11 +1509,12 @@ def main():
         if not args.path:
             print(json.dumps({"ok": False, "error": "--path is required for targeted mode. Example: --path='/start > [Button A]'"}))
             sys.exit(1)
-        report = asyncio.run(run_targeted_test(bot, args.path, timeout=args.timeout))
+        report = asyncio.run(run_targeted_test(bot, args.path, timeout=args.timeout, rate=args.rate))
     else:
         report = asyncio.run(run_test(
             bot, timeout=args.timeout, max_depth=args.max_depth,
             max_buttons=args.max_buttons, mode=args.mode,
+            rate=args.rate,
         ))
 
         # In debug mode, run bug analysis on the completed report
@@ -1400,15 +1523,24 @@ def main():
             report["bugs"] = bugs
             report["health_score"] = compute_health_score(bugs)
 
+    if args.save_jsonl and report.get("ok"):
+        append_jsonl(args.save_jsonl, report)
+
+    encoded = _dumps_report(report)
+
     if args.save and report.get("ok"):
-        reports_dir = Path.home() / ".telegram-bot-autotest" / "reports"
+        reports_dir = config_dir() / "reports"
         reports_dir.mkdir(parents=True, exist_ok=True)
         filename = f"{bot.lstrip('@')}_{args.mode}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
         filepath = reports_dir / filename
-        filepath.write_text(json.dumps(report, indent=2, ensure_ascii=False))
+        filepath.write_bytes(encoded)
+        # --save is the rare path; the saved file itself has no "saved_to"
         report["saved_to"] = str(filepath)
+        encoded = _dumps_report(report)
 
-    print(json.dumps(report, indent=2, ensure_ascii=False))
+    sys.stdout.flush()
+    sys.stdout.buffer.write(encoded + b"\n")
+    sys.stdout.flush()
 
     if not report.get("ok"):
         sys.exit(1)
@@ -2,10 +2,17 @@
 """Telegram login and session management.
 
 Modes:
-  --check              Check if session is valid
+  --check              Check if session is valid (every account in
+                       TG_PHONE_LIST, concurrently, when it is set); an
+                       authorized result is reused for up to 60s while the
+                       session file is unchanged
   --login              Send verification code
-  --verify --code=XXX  Verify SMS code
+  --login --await-code Send code, read it from stdin and sign in on the same
+                       connection (prints one JSON line per step)
+  --verify --code=XXX  Verify SMS code (phone_code_hash from $TG_PHONE_CODE_HASH
+                       if set, else from the file --login wrote)
   --verify --password=X  2FA password verification
+  --phone=+XXX         Run any mode for one account from TG_PHONE_LIST
 
 All output is JSON.
 Exit codes: 0=success, 1=expected failure, 2=unexpected error
@@ -13,27 +20,39 @@ Exit codes: 0=success, 1=expected failure, 2=unexpected error
 
 import argparse
 import asyncio
+import functools
 import json
 import os
 import sys
-from pathlib import Path
+import time
 
 # Ensure parent dir is importable
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
+# Same compact encoder, ~/.telegram-bot-autotest path and .env parser as config.py
+from config import config_dir, dumps, load_settings
+
+_SESSIONS_DIR = config_dir() / "sessions"
+
+
+def _encode(obj):
+    """Serialize `obj` to one newline-terminated JSON line, as bytes."""
+    return (dumps(obj) + "\n").encode()
+
+
+def _emit(blob):
+    """Write an encoded response to stdout in a single write."""
+    sys.stdout.buffer.write(blob)
+    sys.stdout.buffer.flush()
+
 
 def load_config():
-    """Load config from .env file."""
+    """Load config from the .env file; exported TG_* variables override it."""
     try:
-        from dotenv import dotenv_values
-    except ImportError:
-        return None, "python-dotenv not installed"
-
-    env_file = Path.home() / ".telegram-bot-autotest" / ".env"
-    if not env_file.exists():
+        values = load_settings()
+    except FileNotFoundError:
         return None, "Config file not found. Run config.py --set first."
 
-    values = dotenv_values(env_file)
     api_id = values.get("TG_API_ID")
     api_hash = values.get("TG_API_HASH")
     phone = values.get("TG_PHONE")
@@ -50,44 +69,186 @@ def load_config():
 
     session_path = values.get("TG_SESSION_PATH")
     if not session_path:
-        session_path = str(Path.home() / ".telegram-bot-autotest" / "sessions" / "tg_user")
+        session_path = str(_SESSIONS_DIR / "tg_user")
+
+    # Optional extra accounts: TG_PHONE_LIST=+1...,+2...
+    phones = [p.strip() for p in (values.get("TG_PHONE_LIST") or "").split(",") if p.strip()]
 
     return {
         "api_id": int(api_id),
         "api_hash": api_hash,
         "phone": phone,
+        "phones": phones or [phone],
         "session_path": session_path,
     }, None
 
 
-def get_client(config):
-    """Create a Telethon client."""
-    from telethon import TelegramClient
+def account_config(config, phone):
+    """Return `config` retargeted at `phone`.
 
-    session_dir = os.path.dirname(config["session_path"])
-    os.makedirs(session_dir, exist_ok=True)
+    TG_PHONE keeps the configured session file; every other account gets
+    its own file next to it, suffixed with the phone's digits.
+    """
+    if phone == config["phone"]:
+        return config
+    digits = "".join(ch for ch in phone if ch.isdigit())
+    return dict(config, phone=phone, session_path=f"{config['session_path']}_{digits}")
 
-    client = TelegramClient(
-        config["session_path"],
-        config["api_id"],
-        config["api_hash"],
-    )
-    return client
 
+@functools.lru_cache(maxsize=None)
+def _ensure_dir(path):
+    """Create `path` (and parents) at most once per process."""
+    if not os.path.isdir(path):
+        os.makedirs(path, exist_ok=True)
 
-# Store phone_code_hash between --login and --verify calls
-HASH_FILE = Path.home() / ".telegram-bot-autotest" / "sessions" / ".phone_code_hash"
 
+@functools.lru_cache(maxsize=None)
+def _client(session_path, api_id, api_hash):
+    from telethon import TelegramClient
 
-async def cmd_check(config):
-    """Check if current session is authorized."""
+    _ensure_dir(os.path.dirname(session_path))
+    return TelegramClient(session_path, api_id, api_hash)
+
+
+def _run(coro):
+    """Run `coro` to completion, on a uvloop event loop when it is installed."""
+    try:
+        import uvloop
+    except ImportError:
+        return asyncio.run(coro)
+    if hasattr(asyncio, "Runner"):  # Python 3.11+
+        with asyncio.Runner(loop_factory=uvloop.new_event_loop) as runner:
+            return runner.run(coro)
+    asyncio.set_event_loop_policy(uvloop.EventLoopPolicy())
+    return asyncio.run(coro)
+
+
+def get_client(config):
+    """Return the Telethon client for `config`, created once per process.
+
+    Each command runs in a single _run() call, so the client is only
+    ever used on the loop it was created for.
+    """
+    return _client(config["session_path"], config["api_id"], config["api_hash"])
+
+
+def _hash_file(config):
+    """Where --login leaves `config`'s phone_code_hash for --verify.
+
+    Kept next to the account's session file, so logins for different
+    accounts never overwrite or delete each other's pending hash.
+    """
+    return config["session_path"] + ".phone_code_hash"
+
+
+# Scripted flows that already hold the hash can pass it here instead of the hash file
+HASH_ENV = "TG_PHONE_CODE_HASH"
+
+# Responses with no per-call fields are serialized once at import
+_NOT_AUTHORIZED_RESPONSE = {
+    "ok": True,
+    "authorized": False,
+    "message": "Session exists but not authorized. Please login."
+}
+_NOT_AUTHORIZED = _encode(_NOT_AUTHORIZED_RESPONSE)
+_INVALID_CODE = _encode({
+    "ok": False,
+    "error": "Invalid verification code.",
+    "error_type": "PhoneCodeInvalidError",
+    "message": "The code you entered is incorrect. Please try again."
+})
+_NEEDS_2FA = _encode({
+    "ok": False,
+    "needs_2fa": True,
+    "error_type": "SessionPasswordNeededError",
+    "message": "Two-factor authentication is enabled. Please provide your 2FA password with --verify --password=YOUR_PASSWORD"
+})
+_NO_PENDING_LOGIN = _encode({
+    "ok": False,
+    "error": "No pending login found. Run --login first.",
+})
+_NO_CODE_ON_STDIN = _encode({
+    "ok": False,
+    "error": "No verification code received on stdin.",
+})
+_NEED_CODE_OR_PASSWORD = _encode({
+    "ok": False,
+    "error": "Provide --code or --password"
+})
+
+
+def _print_exception(e, prefix):
+    """Print the JSON error for `e`, with `prefix` leading the message."""
+    error = str(e)
+    _emit(_encode({
+        "ok": False,
+        "error": error,
+        "error_type": type(e).__name__,
+        "message": prefix + error
+    }))
+
+
+# A successful --check is reused while the session file is unchanged
+CHECK_CACHE_TTL = 60  # seconds
+
+
+def _session_file(config):
+    """Path of the SQLite file Telethon keeps for `config`'s session."""
+    path = config["session_path"]
+    return path if path.endswith(".session") else path + ".session"
+
+
+def _read_check_cache(config):
+    """Return the cached authorized response for this session, if still valid."""
+    try:
+        mtime_ns = os.stat(_session_file(config)).st_mtime_ns
+        with open(config["session_path"] + ".check.json") as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if cache.get("mtime_ns") != mtime_ns or time.time() >= cache.get("expires_at", 0):
+        return None
+    return cache.get("response")
+
+
+def _write_check_cache(config, response):
+    """Remember an authorized response; failures to write are ignored."""
+    try:
+        mtime_ns = os.stat(_session_file(config)).st_mtime_ns
+        fd = os.open(config["session_path"] + ".check.json", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "mtime_ns": mtime_ns,
+                "expires_at": time.time() + CHECK_CACHE_TTL,
+                "response": response,
+            }, f)
+    except OSError:
+        pass
+
+
+async def _check_account(config):
+    """Check one account's session; returns (response, exit_code)."""
+    response = _read_check_cache(config)
+    if response is not None:
+        return response, 0
+
+    response, code = await _check_account_online(config)
+    if code == 0:
+        # Stat after disconnect, which may itself have rewritten the session
+        _write_check_cache(config, response)
+    return response, code
+
+
+async def _check_account_online(config):
+    """Connect and ask Telegram whether the session is authorized."""
     client = get_client(config)
     try:
         await client.connect()
-        authorized = await client.is_user_authorized()
-        if authorized:
-            me = await client.get_me()
-            print(json.dumps({
+        # get_me() returns None for an unauthorized session, so it doubles
+        # as the is_user_authorized() check without a second round trip
+        me = await client.get_me()
+        if me is not None:
+            return {
                 "ok": True,
                 "authorized": True,
                 "user": {
@@ -98,28 +259,93 @@ async def cmd_check(config):
                     "phone": me.phone,
                 },
                 "message": f"Logged in as {me.first_name} (@{me.username or 'N/A'})"
-            }))
-        else:
-            print(json.dumps({
-                "ok": True,
-                "authorized": False,
-                "message": "Session exists but not authorized. Please login."
-            }))
-            sys.exit(1)
+            }, 0
+        return _NOT_AUTHORIZED_RESPONSE, 1
     except Exception as e:
-        print(json.dumps({
+        return {
             "ok": False,
             "authorized": False,
             "error": str(e),
             "message": "Failed to check session."
-        }))
-        sys.exit(2)
+        }, 2
     finally:
         await client.disconnect()
 
 
-async def cmd_login(config):
-    """Send verification code to phone."""
+async def cmd_check(config):
+    """Check if current session is authorized."""
+    response, code = await _check_account(config)
+    _emit(_NOT_AUTHORIZED if response is _NOT_AUTHORIZED_RESPONSE else _encode(response))
+    if code:
+        sys.exit(code)
+
+
+async def cmd_check_all(config):
+    """Check every account in TG_PHONE_LIST concurrently."""
+    configs = [account_config(config, phone) for phone in config["phones"]]
+    results = await asyncio.gather(*(_check_account(c) for c in configs))
+    accounts = [dict(response, phone=c["phone"]) for c, (response, _) in zip(configs, results)]
+    code = max(code for _, code in results)
+    _emit(_encode({
+        "ok": all(a["ok"] for a in accounts),
+        "authorized": all(a["authorized"] for a in accounts),
+        "accounts": accounts,
+    }))
+    if code:
+        sys.exit(code)
+
+
+async def _sign_in_with_code(client, config, code, phone_code_hash):
+    """Sign in with an SMS code; prints the JSON error and exits on failure."""
+    from telethon.errors import (
+        PhoneCodeInvalidError,
+        SessionPasswordNeededError,
+    )
+
+    try:
+        await client.sign_in(
+            phone=config["phone"],
+            code=code,
+            phone_code_hash=phone_code_hash,
+        )
+    except PhoneCodeInvalidError:
+        _emit(_INVALID_CODE)
+        sys.exit(1)
+    except SessionPasswordNeededError:
+        _emit(_NEEDS_2FA)
+        sys.exit(1)
+
+
+async def _report_signed_in(client, config):
+    """Print the logged-in user and drop the account's pending phone_code_hash."""
+    me = await client.get_me()
+
+    # Clean up hash file
+    try:
+        os.unlink(_hash_file(config))
+    except FileNotFoundError:
+        pass
+
+    _emit(_encode({
+        "ok": True,
+        "authorized": True,
+        "user": {
+            "id": me.id,
+            "first_name": me.first_name,
+            "last_name": me.last_name,
+            "username": me.username,
+            "phone": me.phone,
+        },
+        "message": f"Successfully logged in as {me.first_name} (@{me.username or 'N/A'})"
+    }))
+
+
+async def cmd_login(config, await_code=False):
+    """Send verification code to phone.
+
+    With `await_code`, the code is read from stdin and signed in on the
+    same connection instead of being handed to a later --verify call.
+    """
     client = get_client(config)
     try:
         await client.connect()
@@ -127,7 +353,7 @@ async def cmd_login(config):
         # Check if already authorized
         if await client.is_user_authorized():
             me = await client.get_me()
-            print(json.dumps({
+            _emit(_encode({
                 "ok": True,
                 "already_authorized": True,
                 "message": f"Already logged in as {me.first_name} (@{me.username or 'N/A'})"
@@ -136,25 +362,39 @@ async def cmd_login(config):
 
         result = await client.send_code_request(config["phone"])
 
-        # Save phone_code_hash for verification step
-        HASH_FILE.parent.mkdir(parents=True, exist_ok=True)
-        HASH_FILE.write_text(result.phone_code_hash)
-        os.chmod(HASH_FILE, 0o600)
+        if await_code:
+            _emit(_encode({
+                "ok": True,
+                "code_sent": True,
+                "phone": config["phone"],
+                "message": f"Verification code sent to {config['phone']}. Enter it on stdin."
+            }))
+            line = await asyncio.get_running_loop().run_in_executor(None, sys.stdin.readline)
+            code = line.strip()
+            if not code:
+                _emit(_NO_CODE_ON_STDIN)
+                sys.exit(1)
+            await _sign_in_with_code(client, config, code, result.phone_code_hash)
+            await _report_signed_in(client, config)
+            return
 
-        print(json.dumps({
+        # Save phone_code_hash for verification step
+        hash_file = _hash_file(config)
+        # Same key get_client() used for the session dir, so no syscall
+        _ensure_dir(os.path.dirname(hash_file))
+        # Created with owner-only permissions rather than chmod'ed afterwards
+        fd = os.open(hash_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as f:
+            f.write(result.phone_code_hash)
+
+        _emit(_encode({
             "ok": True,
             "code_sent": True,
             "phone": config["phone"],
             "message": f"Verification code sent to {config['phone']}. Use --verify --code=XXXXX to complete login."
         }))
     except Exception as e:
-        error_type = type(e).__name__
-        print(json.dumps({
-            "ok": False,
-            "error": str(e),
-            "error_type": error_type,
-            "message": f"Failed to send code: {e}"
-        }))
+        _print_exception(e, "Failed to send code: ")
         sys.exit(2)
     finally:
         await client.disconnect()
@@ -162,96 +402,39 @@ async def cmd_login(config):
 
 async def cmd_verify(config, code=None, password=None):
     """Verify SMS code or 2FA password."""
-    from telethon.errors import (
-        PhoneCodeInvalidError,
-        SessionPasswordNeededError,
-    )
-
     client = get_client(config)
     try:
         await client.connect()
 
         if code:
             # Verify SMS code
-            if not HASH_FILE.exists():
-                print(json.dumps({
-                    "ok": False,
-                    "error": "No pending login found. Run --login first.",
-                }))
-                sys.exit(1)
-
-            phone_code_hash = HASH_FILE.read_text().strip()
-
-            try:
-                await client.sign_in(
-                    phone=config["phone"],
-                    code=code,
-                    phone_code_hash=phone_code_hash,
-                )
-            except PhoneCodeInvalidError:
-                print(json.dumps({
-                    "ok": False,
-                    "error": "Invalid verification code.",
-                    "error_type": "PhoneCodeInvalidError",
-                    "message": "The code you entered is incorrect. Please try again."
-                }))
-                sys.exit(1)
-            except SessionPasswordNeededError:
-                print(json.dumps({
-                    "ok": False,
-                    "needs_2fa": True,
-                    "error_type": "SessionPasswordNeededError",
-                    "message": "Two-factor authentication is enabled. Please provide your 2FA password with --verify --password=YOUR_PASSWORD"
-                }))
-                sys.exit(1)
+            phone_code_hash = os.environ.get(HASH_ENV, "").strip()
+            if not phone_code_hash:
+                hash_file = _hash_file(config)
+                if not os.path.exists(hash_file):
+                    _emit(_NO_PENDING_LOGIN)
+                    sys.exit(1)
+                with open(hash_file) as f:
+                    phone_code_hash = f.read().strip()
+            await _sign_in_with_code(client, config, code, phone_code_hash)
 
         elif password:
             # 2FA password verification
             try:
                 await client.sign_in(password=password)
             except Exception as e:
-                print(json.dumps({
-                    "ok": False,
-                    "error": str(e),
-                    "error_type": type(e).__name__,
-                    "message": f"2FA verification failed: {e}"
-                }))
+                _print_exception(e, "2FA verification failed: ")
                 sys.exit(1)
         else:
-            print(json.dumps({
-                "ok": False,
-                "error": "Provide --code or --password"
-            }))
+            _emit(_NEED_CODE_OR_PASSWORD)
             sys.exit(1)
 
         # Success - get user info
-        me = await client.get_me()
-
-        # Clean up hash file
-        if HASH_FILE.exists():
-            HASH_FILE.unlink()
-
-        print(json.dumps({
-            "ok": True,
-            "authorized": True,
-            "user": {
-                "id": me.id,
-                "first_name": me.first_name,
-                "last_name": me.last_name,
-                "username": me.username,
-                "phone": me.phone,
-            },
-            "message": f"Successfully logged in as {me.first_name} (@{me.username or 'N/A'})"
-        }))
+        await _report_signed_in(client, config)
     except SystemExit:
         raise
     except Exception as e:
-        print(json.dumps({
-            "ok": False,
-            "error": str(e),
-            "error_type": type(e).__name__,
-            "message": f"Verification failed: {e}"
-        }))
+        _print_exception(e, "Verification failed: ")
         sys.exit(2)
     finally:
         await client.disconnect()
@@ -262,22 +445,31 @@ def main():
     parser.add_argument("--check", action="store_true", help="Check session status")
     parser.add_argument("--login", action="store_true", help="Send verification code")
     parser.add_argument("--verify", action="store_true", help="Verify code or 2FA password")
+    parser.add_argument("--await-code", action="store_true",
+                        help="With --login: read the code from stdin and sign in on the same connection")
     parser.add_argument("--code", help="SMS verification code")
     parser.add_argument("--password", help="2FA password")
+    parser.add_argument("--phone", help="Account to use when TG_PHONE_LIST lists several")
 
     args = parser.parse_args()
 
     config, error = load_config()
     if error:
-        print(json.dumps({"ok": False, "error": error}))
+        _emit(_encode({"ok": False, "error": error}))
         sys.exit(1)
 
-    if args.check:
-        asyncio.run(cmd_check(config))
+    if args.phone:
+        config = account_config(config, args.phone)
+        config["phones"] = [args.phone]
+
+    if args.check and len(config["phones"]) > 1:
+        _run(cmd_check_all(config))
+    elif args.check:
+        _run(cmd_check(config))
     elif args.login:
-        asyncio.run(cmd_login(config))
+        _run(cmd_login(config, await_code=args.await_code))
     elif args.verify:
-        asyncio.run(cmd_verify(config, code=args.code, password=args.password))
+        _run(cmd_verify(config, code=args.code, password=args.password))
     else:
         parser.print_help()
         sys.exit(1)